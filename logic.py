@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from datetime import date, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
 
-from models import DailyMacro, Weight, Target
+from models import DailyMacro, Weight, Target, LoggedDays
+from schemas import FIRST_LOGGABLE_DAY, LAST_LOGGABLE_DAY
 
 
 def _r2(x: Optional[float]) -> Optional[float]:
@@ -258,4 +259,120 @@ def calorie_adjustment(days: int, start: date, end: date, macro_rows: List[Daily
             },
             "notes": notes,
             "warnings": warnings,
-        }
\ No newline at end of file
+        }
+
+
+def _bits(raw: Optional[bytes]) -> int:
+    return int.from_bytes(raw or b"", "little")
+
+
+def _to_bytes(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def _loggable(days: Iterable[date]) -> List[date]:
+    # Raw rows written before the day bounds existed may fall outside them
+    return [d for d in days if FIRST_LOGGABLE_DAY <= d <= LAST_LOGGABLE_DAY]
+
+
+def mark_logged_days(logged: LoggedDays, *, macro_days: Iterable[date] = (), weight_days: Iterable[date] = ()) -> None:
+    macro_days = _loggable(macro_days)
+    weight_days = _loggable(weight_days)
+    if not macro_days and not weight_days:
+        return
+
+    macro_bits = _bits(logged.macro_bits)
+    weight_bits = _bits(logged.weight_bits)
+
+    # An entry before the current anchor moves the anchor back and shifts existing bits up
+    earliest = min(macro_days + weight_days)
+    if logged.first_day is None:
+        logged.first_day = earliest
+    elif earliest < logged.first_day:
+        shift = (logged.first_day - earliest).days
+        macro_bits <<= shift
+        weight_bits <<= shift
+        logged.first_day = earliest
+
+    for d in macro_days:
+        macro_bits |= 1 << (d - logged.first_day).days
+    for d in weight_days:
+        weight_bits |= 1 << (d - logged.first_day).days
+
+    logged.macro_bits = _to_bytes(macro_bits)
+    logged.weight_bits = _to_bytes(weight_bits)
+
+
+def rebuild_logged_days(logged: LoggedDays, *, macro_days: Iterable[date], weight_days: Iterable[date]) -> None:
+    logged.first_day = None
+    logged.macro_bits = b""
+    logged.weight_bits = b""
+    mark_logged_days(logged, macro_days=macro_days, weight_days=weight_days)
+
+
+def _window_bits(bits: int, first_day: date, start: date, days: int) -> int:
+    # Re-anchor so bit 0 is `start`, then keep `days` bits
+    offset = (start - first_day).days
+    w = bits >> offset if offset >= 0 else bits << -offset
+    return w & ((1 << days) - 1)
+
+
+def _current_streak(bits: int, first_day: date, as_of: date) -> int:
+    p = (as_of - first_day).days
+    if p < 0:
+        return 0
+    mask = (1 << (p + 1)) - 1
+    gaps = ~bits & mask
+    # Distance from as_of back to the most recent unlogged day
+    return p - (gaps.bit_length() - 1)
+
+
+def _longest_run(bits: int) -> int:
+    # Runs of set bits are runs of "1" in the binary rendering; split/len stays in C
+    return max(map(len, bin(bits)[2:].split("0"))) if bits else 0
+
+
+def _unset_days(bits: int, start: date, days: int) -> List[date]:
+    # Reversed so string index i is bit i, i.e. start + i days
+    gaps = bin(~bits & ((1 << days) - 1))[:1:-1]
+    missing: List[date] = []
+    i = gaps.find("1")
+    while i != -1:
+        missing.append(start + timedelta(days=i))
+        i = gaps.find("1", i + 1)
+    return missing
+
+
+def build_adherence(*, start: date, end: date, logged: Optional[LoggedDays], source: str) -> Dict[str, Any]:
+    days = (end - start).days
+
+    if logged is not None:
+        macro_bits = _bits(logged.macro_bits)
+        weight_bits = _bits(logged.weight_bits)
+        if source == "macros":
+            bits = macro_bits
+        elif source == "weights":
+            bits = weight_bits
+        else:
+            bits = macro_bits | weight_bits
+        first_day = logged.first_day
+    else:
+        bits = 0
+        first_day = start
+
+    window = _window_bits(bits, first_day, start, days)
+    days_logged = window.bit_count()
+
+    return {
+        "range": {"start": start, "end_exclusive": end},
+        "source": source,
+        "tracking_since": logged.first_day if logged is not None else None,
+        "window_days": days,
+        "days_logged": days_logged,
+        "adherence_%": _r2(days_logged / days * 100),
+        "streaks": {
+            "current": _current_streak(bits, first_day, end - timedelta(days=1)),
+            "longest_in_window": _longest_run(window),
+        },
+        "missing_days": _unset_days(window, start, days),
+    }
@@ -1,19 +1,28 @@
 from fastapi import FastAPI, Depends, HTTPException, Query, status
 from datetime import date, timedelta
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
+import time
 
 from db import engine, SessionLocal, Base
-from models import User, Weight, DailyMacro, Target
+from models import User, Weight, DailyMacro, Target, LoggedDays
 from schemas import (
     WeightIn, MacroIn, TargetIn,
     UserIn, UserOut, UsersListOut,
     WeightUpsertOut, WeightsListOut,
     MacroUpsertOut, MacrosListOut,
     TargetUpsertOut, TargetGetOut,
-    WeightBulkUpsertOut, MacroBulkUpsertOut
+    WeightBulkUpsertOut, MacroBulkUpsertOut,
+    IngestIn, IngestUserIn, IngestOut,
+    FIRST_LOGGABLE_DAY, LAST_LOGGABLE_DAY
+)
+from logic import (
+    build_weekly_insight, build_rolling_insights, calorie_adjustment,
+    build_adherence, mark_logged_days, rebuild_logged_days
 )
-from logic import build_weekly_insight, build_rolling_insights, calorie_adjustment
 
 # uvicorn main:app --reload
 # or uvicorn main:app --host 0.0.0.0 --port 8000
@@ -35,6 +44,165 @@ def get_user_by_username(db: Session, username: str) -> User:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+def _raw_logged_days(db: Session, model, user_ids: List[int]) -> Dict[int, List[date]]:
+    days: Dict[int, List[date]] = {user_id: [] for user_id in user_ids}
+    for user_id, day in db.execute(select(model.user_id, model.day).where(model.user_id.in_(user_ids))):
+        days[user_id].append(day)
+    return days
+
+def load_logged_days(db: Session, user_id: int) -> Optional[LoggedDays]:
+    logged = db.query(LoggedDays).filter(LoggedDays.user_id == user_id).first()
+    if logged is None:
+        # Users with history from before the bitmap existed are backfilled in memory only;
+        # the next upsert or rebuild persists it
+        logged = LoggedDays(user_id=user_id)
+        rebuild_logged_days(
+            logged,
+            macro_days=_raw_logged_days(db, DailyMacro, [user_id])[user_id],
+            weight_days=_raw_logged_days(db, Weight, [user_id])[user_id],
+        )
+        if logged.first_day is None:
+            return None
+    return logged
+
+def lock_logged_days(db: Session, first_days: Dict[int, date], skip_backfill=frozenset()) -> Dict[int, LoggedDays]:
+    # The insert is a write, so SQLite takes its write lock here and holds it until commit;
+    # the bitmaps read below can't be rewritten by another request before this one commits
+    stmt = sqlite_insert(LoggedDays).on_conflict_do_nothing(index_elements=[LoggedDays.user_id]).returning(LoggedDays.user_id)
+    created = set(db.scalars(stmt, [
+        {"user_id": user_id, "first_day": day, "macro_bits": b"", "weight_bits": b""}
+        for user_id, day in first_days.items()
+    ]))
+    bitmaps = {
+        r.user_id: r
+        for r in db.query(LoggedDays).filter(LoggedDays.user_id.in_(list(first_days))).populate_existing()
+    }
+
+    # Rows created just now start empty; users with history from before the bitmap existed are backfilled
+    legacy = [user_id for user_id in created if user_id not in skip_backfill]
+    if legacy:
+        raw_macros = _raw_logged_days(db, DailyMacro, legacy)
+        raw_weights = _raw_logged_days(db, Weight, legacy)
+        for user_id in legacy:
+            rebuild_logged_days(bitmaps[user_id], macro_days=raw_macros[user_id], weight_days=raw_weights[user_id])
+    return bitmaps
+
+def record_logged_days(db: Session, user_id: int, *, macro_days=(), weight_days=()) -> None:
+    macro_days = list(macro_days)
+    weight_days = list(weight_days)
+    if not macro_days and not weight_days:
+        return
+    logged = lock_logged_days(db, {user_id: min(macro_days + weight_days)})[user_id]
+    mark_logged_days(logged, macro_days=macro_days, weight_days=weight_days)
+
+# Two bind params per (user_id, day) pair; keeps each statement under SQLite's 32766 variable limit
+PAIR_LOOKUP_BATCH = 10000
+
+def _existing_days(db: Session, model, keys: List[tuple]) -> set:
+    # Exact (user_id, day) matches served by the unique (user_id, day) index
+    existing = set()
+    for i in range(0, len(keys), PAIR_LOOKUP_BATCH):
+        q = select(model.user_id, model.day).where(tuple_(model.user_id, model.day).in_(keys[i:i + PAIR_LOOKUP_BATCH]))
+        existing.update((uid, day) for uid, day in db.execute(q))
+    return existing
+
+def ingest_chunk(db: Session, batch: Dict[str, IngestUserIn]) -> Dict[str, Dict[str, Any]]:
+    usernames = list(batch)
+    # Insert-or-ignore first so overlapping ingests of the same new users don't collide; this also
+    # takes SQLite's write lock before any reads below
+    stmt = sqlite_insert(User).on_conflict_do_nothing(index_elements=[User.username]).returning(User.username)
+    created_users = set(db.scalars(stmt, [{"username": u} for u in usernames]))
+    ids = dict(db.execute(select(User.username, User.id).where(User.username.in_(usernames))).all())
+
+    results = {
+        u: {
+            "user_id": ids[u],
+            "user_created": u in created_users,
+            "weights": {"created": 0, "updated": 0},
+            "macros": {"created": 0, "updated": 0},
+            "target": None,
+        }
+        for u in usernames
+    }
+
+    # Last entry wins when a day is repeated for the same user
+    weight_rows = {
+        (ids[u], e.day): {"user_id": ids[u], "day": e.day, "weight_lbs": e.weight_lbs}
+        for u, payload in batch.items() for e in payload.weights
+    }
+    macro_rows = {
+        (ids[u], e.day): {"user_id": ids[u], **e.model_dump()}
+        for u, payload in batch.items() for e in payload.macros
+    }
+    target_rows = [
+        {"user_id": ids[u], **payload.target.model_dump()}
+        for u, payload in batch.items() if payload.target is not None
+    ]
+
+    existing_weights = _existing_days(db, Weight, list(weight_rows))
+    existing_macros = _existing_days(db, DailyMacro, list(macro_rows))
+    existing_targets = set()
+    if target_rows:
+        existing_targets = set(db.scalars(select(Target.user_id).where(Target.user_id.in_([r["user_id"] for r in target_rows]))))
+
+    names = {user_id: u for u, user_id in ids.items()}
+    for key in weight_rows:
+        results[names[key[0]]]["weights"]["updated" if key in existing_weights else "created"] += 1
+    for key in macro_rows:
+        results[names[key[0]]]["macros"]["updated" if key in existing_macros else "created"] += 1
+    for row in target_rows:
+        results[names[row["user_id"]]]["target"] = "updated" if row["user_id"] in existing_targets else "created"
+
+    if weight_rows:
+        stmt = sqlite_insert(Weight)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Weight.user_id, Weight.day],
+            set_={"weight_lbs": stmt.excluded.weight_lbs},
+        )
+        db.execute(stmt, list(weight_rows.values()))
+
+    if macro_rows:
+        stmt = sqlite_insert(DailyMacro)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyMacro.user_id, DailyMacro.day],
+            set_={
+                "calories": stmt.excluded.calories,
+                "protein_g": stmt.excluded.protein_g,
+                "carbs_g": stmt.excluded.carbs_g,
+                "fat_g": stmt.excluded.fat_g,
+            },
+        )
+        db.execute(stmt, list(macro_rows.values()))
+
+    if target_rows:
+        stmt = sqlite_insert(Target)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Target.user_id],
+            set_={
+                "calories_target": stmt.excluded.calories_target,
+                "protein_target_g": stmt.excluded.protein_target_g,
+                "carbs_target_g": stmt.excluded.carbs_target_g,
+                "fat_target_g": stmt.excluded.fat_target_g,
+            },
+        )
+        db.execute(stmt, target_rows)
+
+    macro_days: Dict[int, List[date]] = {}
+    weight_days: Dict[int, List[date]] = {}
+    for user_id, day in macro_rows:
+        macro_days.setdefault(user_id, []).append(day)
+    for user_id, day in weight_rows:
+        weight_days.setdefault(user_id, []).append(day)
+
+    touched = set(macro_days) | set(weight_days)
+    if touched:
+        first_days = {user_id: min(macro_days.get(user_id, []) + weight_days.get(user_id, [])) for user_id in touched}
+        bitmaps = lock_logged_days(db, first_days, skip_backfill={ids[u] for u in created_users})
+        for user_id in touched:
+            mark_logged_days(bitmaps[user_id], macro_days=macro_days.get(user_id, ()), weight_days=weight_days.get(user_id, ()))
+
+    return results
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -55,11 +223,55 @@ def list_users(db: Session = Depends(get_db)):
     users = db.query(User).order_by(User.id.asc()).all()
     return {"count": len(users),"users": users}
 
+@app.post("/ingest", response_model=IngestOut)
+def ingest(batch: IngestIn, chunk_size: Optional[int] = Query(None, ge=1), db: Session = Depends(get_db)):
+    # chunk_size = users per transaction; omitted means the whole batch commits at once.
+    # Chunked mode is not all-or-nothing: chunks before a failing one stay committed and are listed in the error
+    started = time.perf_counter()
+    usernames = list(batch.users)
+    size = chunk_size or max(len(usernames), 1)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    chunks = 0
+    for i in range(0, len(usernames), size):
+        chunk = {u: batch.users[u] for u in usernames[i:i + size]}
+        try:
+            results.update(ingest_chunk(db, chunk))
+            db.commit()
+        except SQLAlchemyError as exc:
+            db.rollback()
+            raise HTTPException(status_code=500, detail={
+                "error": f"chunk {chunks} failed: {type(exc).__name__}",
+                "committed_chunks": chunks,
+                "committed_users": usernames[:i],
+                "failed_from": usernames[i],
+            })
+        chunks += 1
+
+    users_created = sum(1 for r in results.values() if r["user_created"])
+    rows = users_created + sum(
+        r["weights"]["created"] + r["weights"]["updated"]
+        + r["macros"]["created"] + r["macros"]["updated"]
+        + (1 if r["target"] else 0)
+        for r in results.values()
+    )
+    elapsed = time.perf_counter() - started
+
+    return {
+        "users_created": users_created,
+        "rows": rows,
+        "chunks": chunks,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        "results": results,
+    }
+
 @app.post("/weights", response_model=WeightUpsertOut)
 def upsert_weight(username:str, entry: WeightIn, db: Session = Depends(get_db)):
     user = get_user_by_username(db, username)
     user_id = user.id
     existing = db.query(Weight).filter(Weight.user_id == user_id, Weight.day == entry.day).first()
+    record_logged_days(db, user_id, weight_days=[entry.day])
 
     if existing:
         existing.weight_lbs = entry.weight_lbs
@@ -99,6 +311,7 @@ def bulk_upsert_weights(username: str, entries: List[WeightIn], db: Session = De
             created += 1
             saved_rows.append(row)
 
+    record_logged_days(db, user_id, weight_days=[e.day for e in entries])
     db.commit()
     for r in saved_rows:
         db.refresh(r)
@@ -125,6 +338,7 @@ def upsert_macros(username:str, entry: MacroIn, db: Session = Depends(get_db)):
     user = get_user_by_username(db, username)
     user_id = user.id
     existing = db.query(DailyMacro).filter(DailyMacro.user_id == user_id, DailyMacro.day == entry.day).first()
+    record_logged_days(db, user_id, macro_days=[entry.day])
 
     if existing:
         existing.calories = entry.calories
@@ -170,6 +384,7 @@ def bulk_upsert_macros(username: str, entries: List[MacroIn], db: Session = Depe
             created += 1
             saved_rows.append(row)
 
+    record_logged_days(db, user_id, macro_days=[e.day for e in entries])
     db.commit()
     for r in saved_rows:
         db.refresh(r)
@@ -253,6 +468,46 @@ def rolling_insights(username:str, days: int = 7, db: Session = Depends(get_db))
         weight_rows=weight_rows
     )
 
+# Ten years, leap days included; also bounds the size of missing_days
+MAX_ADHERENCE_WINDOW_DAYS = 3653
+
+@app.get("/insights/adherence")
+def adherence_insight(username:str, start: Optional[date] = Query(None, ge=FIRST_LOGGABLE_DAY, le=LAST_LOGGABLE_DAY), end: Optional[date] = Query(None, ge=FIRST_LOGGABLE_DAY, le=LAST_LOGGABLE_DAY + timedelta(days=1)), source: str = Query("macros", pattern="^(macros|weights|any)$"), db: Session = Depends(get_db)):
+    user = get_user_by_username(db, username)
+    user_id = user.id
+    logged = load_logged_days(db, user_id)
+
+    if end is None:
+        end = date.today() + timedelta(days=1)
+    if start is None:
+        # Future-dated first entries (or an early end) leave nothing before end; fall back to the last week
+        if logged is not None and logged.first_day < end:
+            start = max(logged.first_day, end - timedelta(days=MAX_ADHERENCE_WINDOW_DAYS))
+        else:
+            start = end - timedelta(days=7)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if (end - start).days > MAX_ADHERENCE_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"window cannot exceed {MAX_ADHERENCE_WINDOW_DAYS} days")
+
+    return build_adherence(start=start, end=end, logged=logged, source=source)
+
+@app.post("/insights/adherence/rebuild")
+def rebuild_adherence(username:str, db: Session = Depends(get_db)):
+    user = get_user_by_username(db, username)
+    user_id = user.id
+    logged = lock_logged_days(db, {user_id: date.today()}, skip_backfill={user_id})[user_id]
+
+    macro_days = _raw_logged_days(db, DailyMacro, [user_id])[user_id]
+    weight_days = _raw_logged_days(db, Weight, [user_id])[user_id]
+    rebuild_logged_days(logged, macro_days=macro_days, weight_days=weight_days)
+
+    if logged.first_day is None:
+        db.delete(logged)
+    db.commit()
+
+    return {"tracking_since": logged.first_day, "macro_days": len(macro_days), "weight_days": len(weight_days)}
+
 @app.get("/adjustment/weight")
 def weight_adjustments(username:str, desired_lbs_per_week: float, days: int = 35, db: Session = Depends(get_db)):
     user = get_user_by_username(db, username)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Date, Float, String, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, Date, Float, String, LargeBinary, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from db import Base
 
@@ -11,6 +11,7 @@ class User(Base):
     weights = relationship("Weight", back_populates="user")
     macros = relationship("DailyMacro", back_populates="user")
     target = relationship("Target", back_populates="user", uselist=False)
+    logged_days = relationship("LoggedDays", back_populates="user", uselist=False)
 
 class Weight(Base):
     __tablename__ = "weights"
@@ -51,4 +52,17 @@ class Target(Base):
     carbs_target_g = Column(Float, nullable=False)
     fat_target_g = Column(Float, nullable=False)
 
-    user = relationship("User", back_populates="target")
\ No newline at end of file
+    user = relationship("User", back_populates="target")
+
+class LoggedDays(Base):
+    __tablename__ = "logged_days"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
+
+    # Bit i is set when the user logged on first_day + i days (little-endian bytes)
+    first_day = Column(Date, nullable=False)
+    macro_bits = Column(LargeBinary, nullable=False, default=b"")
+    weight_bits = Column(LargeBinary, nullable=False, default=b"")
+
+    user = relationship("User", back_populates="logged_days")
\ No newline at end of file
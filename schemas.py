@@ -1,16 +1,20 @@
 from datetime import date
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import Annotated, Dict, List, Optional
+
+# Loggable days; keeps each user's logged-day bitmap to a few KB
+FIRST_LOGGABLE_DAY = date(1970, 1, 1)
+LAST_LOGGABLE_DAY = date(2100, 12, 31)
 
 class UserIn(BaseModel):
     username: str = Field(min_length=3, max_length=20)
 
 class WeightIn(BaseModel):
-    day: date
+    day: date = Field(ge=FIRST_LOGGABLE_DAY, le=LAST_LOGGABLE_DAY)
     weight_lbs: float = Field(gt=0, lt=1000)
 
 class MacroIn(BaseModel):
-    day: date
+    day: date = Field(ge=FIRST_LOGGABLE_DAY, le=LAST_LOGGABLE_DAY)
     calories: int = Field(gt=0, lt=20000)
     protein_g: float = Field(gt=0, lt=1000)
     carbs_g: float = Field(gt=0, lt=2000)
@@ -22,6 +26,14 @@ class TargetIn(BaseModel):
     carbs_target_g: float = Field(ge=0, lt=2000)
     fat_target_g: float = Field(ge=0, lt=1000)
 
+class IngestUserIn(BaseModel):
+    weights: List[WeightIn] = []
+    macros: List[MacroIn] = []
+    target: Optional[TargetIn] = None
+
+class IngestIn(BaseModel):
+    users: Dict[Annotated[str, Field(min_length=3, max_length=20)], IngestUserIn]
+
 
 class UserOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -92,3 +104,23 @@ class MacroUpsertOut(BaseModel):
 class TargetUpsertOut(BaseModel):
     action: str
     target: TargetOut
+
+# ingestion responses
+class IngestCountsOut(BaseModel):
+    created: int
+    updated: int
+
+class IngestUserOut(BaseModel):
+    user_id: int
+    user_created: bool
+    weights: IngestCountsOut
+    macros: IngestCountsOut
+    target: Optional[str]
+
+class IngestOut(BaseModel):
+    users_created: int
+    rows: int
+    chunks: int
+    elapsed_ms: float
+    rows_per_second: float
+    results: Dict[str, IngestUserOut]